@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import io
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
@@ -14,8 +17,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# カスタムCSS
-st.markdown("""
+# 静的HTML/CSS
+CUSTOM_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -47,7 +50,32 @@ st.markdown("""
         margin: 1rem 0;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+MAIN_HEADER_HTML = '<h1 class="main-header">⚓ 配船シミュレーター POC</h1>'
+
+GETTING_STARTED_HTML = """
+        <div class="simulator-card">
+            <h3>🚀 シミュレーター開始手順</h3>
+            <ol>
+                <li>👈 サイドバーの「サンプルデータ読み込み」ボタンをクリック</li>
+                <li>📊 データが読み込まれたら各タブでシミュレーションを実行</li>
+                <li>📈 結果を分析して最適解を確認</li>
+            </ol>
+        </div>
+"""
+
+# カスタムCSS
+# Streamlitは再実行時に出力されなかった要素を破棄するため、CSSも毎回出力する
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+# シミュレーション履歴（構造化配列）の型
+HISTORY_DTYPE = np.dtype([
+    ('timestamp', 'datetime64[ns]'),
+    ('ships_count', 'i4'),
+    ('method', 'U32'),
+    ('total_cost', 'f8')
+])
 
 def initialize_session_state():
     """セッション状態の初期化"""
@@ -56,6 +84,7 @@ def initialize_session_state():
         
     if 'ships' not in st.session_state:
         st.session_state.ships = []
+        st.session_state._ship_by_id = {}
         
     if 'ports' not in st.session_state:
         st.session_state.ports = []
@@ -64,57 +93,154 @@ def initialize_session_state():
         st.session_state.simulation_results = {}
         
     if 'simulation_history' not in st.session_state:
-        st.session_state.simulation_history = []
-
-def load_sample_data():
-    """サンプルデータの読み込み"""
-    try:
-        # サンプル船舶データ
-        sample_ships = [
-            Ship("SIM001", "Pacific Explorer", 280, 38, 12, "container", 
-                 (35.1, 139.8), datetime.now() + timedelta(hours=6), 5),
-            Ship("SIM002", "Ocean Guardian", 220, 32, 10, "bulk", 
-                 (34.7, 135.3), datetime.now() + timedelta(hours=10), 4),
-            Ship("SIM003", "Sea Pioneer", 320, 42, 14, "container", 
-                 (34.9, 135.1), datetime.now() + timedelta(hours=4), 5),
-            Ship("SIM004", "Blue Horizon", 180, 28, 8, "general", 
-                 (35.2, 140.1), datetime.now() + timedelta(hours=15), 3),
-            Ship("SIM005", "Maritime Star", 250, 35, 11, "tanker", 
-                 (34.6, 135.4), datetime.now() + timedelta(hours=8), 4)
-        ]
-        
-        # サンプル港湾データ
-        berths_tokyo = [
-            Berth("TKY_CT1", "TKY", "コンテナターミナル1", 320, 45, 16, 
-                  ["container"], ["gantry_crane", "reefer", "lighting"], 12000),
-            Berth("TKY_CT2", "TKY", "コンテナターミナル2", 300, 40, 15, 
-                  ["container"], ["gantry_crane", "reefer"], 10000),
-            Berth("TKY_GP1", "TKY", "汎用バース1", 250, 35, 12, 
-                  ["general", "bulk"], ["mobile_crane", "conveyor"], 6000)
-        ]
+        st.session_state.simulation_history = np.empty(0, dtype=HISTORY_DTYPE)
         
-        berths_osaka = [
-            Berth("OSA_CT1", "OSA", "大阪コンテナターミナル", 280, 38, 14, 
-                  ["container"], ["gantry_crane", "reefer"], 9000),
-            Berth("OSA_BK1", "OSA", "バルクターミナル", 200, 30, 10, 
-                  ["bulk"], ["conveyor", "hopper"], 5000)
+    if 'session_start' not in st.session_state:
+        st.session_state.session_start = datetime.now()
+
+# サンプル船舶定義: (ID, 船名, 船長, 船幅, 喫水, 貨物種別, 現在位置, ETA(時間後), 優先度)
+SAMPLE_SHIP_SPECS = (
+    ("SIM001", "Pacific Explorer", 280, 38, 12, "container", (35.1, 139.8), 6, 5),
+    ("SIM002", "Ocean Guardian", 220, 32, 10, "bulk", (34.7, 135.3), 10, 4),
+    ("SIM003", "Sea Pioneer", 320, 42, 14, "container", (34.9, 135.1), 4, 5),
+    ("SIM004", "Blue Horizon", 180, 28, 8, "general", (35.2, 140.1), 15, 3),
+    ("SIM005", "Maritime Star", 250, 35, 11, "tanker", (34.6, 135.4), 8, 4),
+)
+
+# サンプル港湾定義: (ID, 港湾名, 位置)
+SAMPLE_PORT_SPECS = (
+    ("TKY", "東京港", (35.6162, 139.7422)),
+    ("OSA", "大阪港", (34.6518, 135.5063)),
+)
+
+# サンプルバース定義（港湾ID別）: (ID, 港湾ID, バース名, 長さ, 幅, 最大喫水, 対応貨物, 設備, 時間単価)
+SAMPLE_BERTH_SPECS = {
+    "TKY": (
+        ("TKY_CT1", "TKY", "コンテナターミナル1", 320, 45, 16,
+         ("container",), ("gantry_crane", "reefer", "lighting"), 12000),
+        ("TKY_CT2", "TKY", "コンテナターミナル2", 300, 40, 15,
+         ("container",), ("gantry_crane", "reefer"), 10000),
+        ("TKY_GP1", "TKY", "汎用バース1", 250, 35, 12,
+         ("general", "bulk"), ("mobile_crane", "conveyor"), 6000),
+    ),
+    "OSA": (
+        ("OSA_CT1", "OSA", "大阪コンテナターミナル", 280, 38, 14,
+         ("container",), ("gantry_crane", "reefer"), 9000),
+        ("OSA_BK1", "OSA", "バルクターミナル", 200, 30, 10,
+         ("bulk",), ("conveyor", "hopper"), 5000),
+    ),
+}
+
+@st.cache_data(ttl=3600)
+def load_sample_data(session_start: datetime):
+    """サンプルデータの読み込み（ETAはセッション開始時刻基準）"""
+    # サンプル船舶データ
+    sample_ships = [
+        Ship(ship_id, name, length, width, draft, cargo_type,
+             location, session_start + timedelta(hours=eta_hours), priority)
+        for ship_id, name, length, width, draft, cargo_type, location, eta_hours, priority
+        in SAMPLE_SHIP_SPECS
+    ]
+    
+    # サンプル港湾データ
+    sample_ports = []
+    for port_id, port_name, location in SAMPLE_PORT_SPECS:
+        berths = [
+            Berth(berth_id, berth_port_id, name, length, width, max_draft,
+                  list(cargo_types), list(equipment), hourly_cost)
+            for berth_id, berth_port_id, name, length, width, max_draft, cargo_types, equipment, hourly_cost
+            in SAMPLE_BERTH_SPECS[port_id]
         ]
-        
-        port_tokyo = Port("TKY", "東京港", (35.6162, 139.7422), berths_tokyo, {}, {})
-        port_osaka = Port("OSA", "大阪港", (34.6518, 135.5063), berths_osaka, {}, {})
-        
-        return sample_ships, [port_tokyo, port_osaka]
-    except Exception as e:
-        st.error(f"サンプルデータの読み込みエラー: {e}")
-        return [], []
+        sample_ports.append(Port(port_id, port_name, location, berths, {}, {}))
+    
+    return sample_ships, sample_ports
+
+# グラフ生成（入力データが変わらない再実行ではキャッシュを再利用）
+@st.cache_data
+def build_cost_breakdown_pie(ship_id: str, cost_items: tuple):
+    """費用内訳の円グラフを生成"""
+    return px.pie(
+        values=[cost for _, cost in cost_items],
+        names=[name for name, _ in cost_items],
+        title=f"{ship_id} 費用内訳"
+    )
+
+@st.cache_data
+def build_cargo_pie(cargo_types: tuple):
+    """貨物種別分布の円グラフを生成"""
+    cargo_names, cargo_counts = np.unique(np.array(cargo_types, dtype=object), return_counts=True)
+    return px.pie(
+        values=cargo_counts, 
+        names=cargo_names,
+        title="🚢 貨物種別分布",
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+
+@st.cache_data
+def build_ship_size_scatter(ship_data: pd.DataFrame):
+    """船舶サイズ分布の散布図を生成"""
+    return px.scatter(
+        ship_data, 
+        x='length', 
+        y='width', 
+        size='priority',
+        color='cargo_type',
+        hover_name='name',
+        title="📏 船舶サイズ分布",
+        labels={'length': '船長(m)', 'width': '船幅(m)'}
+    )
+
+@st.cache_data
+def build_history_charts(history_df: pd.DataFrame):
+    """シミュレーション履歴の推移グラフを生成"""
+    fig_timeline = px.line(
+        history_df, 
+        x='timestamp', 
+        y='total_cost',
+        title="💰 総費用推移",
+        markers=True
+    )
+    fig_ships = px.bar(
+        history_df, 
+        x='timestamp', 
+        y='ships_count',
+        title="🚢 処理船舶数推移"
+    )
+    return fig_timeline, fig_ships
+
+@st.cache_data
+def build_allocation_charts(df: pd.DataFrame):
+    """配船結果の港湾別グラフを生成"""
+    port_costs = df.groupby('port')['total_cost'].sum().reset_index()
+    fig_port_costs = px.bar(
+        port_costs, 
+        x='port', 
+        y='total_cost',
+        title="🏭 港湾別総費用",
+        labels={'total_cost': '総費用(¥)', 'port': '港湾'}
+    )
+    fig_waiting = px.box(
+        df, 
+        x='port', 
+        y='waiting_time',
+        title="⏰ 港湾別待機時間分布",
+        labels={'waiting_time': '待機時間(h)', 'port': '港湾'}
+    )
+    return fig_port_costs, fig_waiting
+
+def dataframe_to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """DataFrameをCSV（UTF-8）のバイト列に変換"""
+    # pandasのPython実装ではなくpyarrowのC++ライタで書き出す
+    buffer = io.BytesIO()
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buffer)
+    return buffer.getvalue()
 
 def main():
     """メインアプリケーション"""
     initialize_session_state()
     
     # ヘッダー
-    st.markdown('<h1 class="main-header">⚓ 配船シミュレーター POC</h1>', 
-                unsafe_allow_html=True)
+    st.markdown(MAIN_HEADER_HTML, unsafe_allow_html=True)
     
     # サイドバー
     with st.sidebar:
@@ -122,19 +248,23 @@ def main():
         
         # サンプルデータ読み込みボタン
         if st.button("📋 サンプルデータ読み込み", type="primary", use_container_width=True):
-            ships, ports = load_sample_data()
-            st.session_state.ships = ships
-            st.session_state.ports = ports
-            
-            # シミュレーターにデータを追加
-            st.session_state.simulator = ShippingSimulator()
-            for ship in ships:
-                st.session_state.simulator.add_ship(ship)
-            for port in ports:
-                st.session_state.simulator.add_port(port)
+            # 例外はキャッシュ関数の外で処理する（失敗結果をキャッシュさせない）
+            try:
+                ships, ports = load_sample_data(st.session_state.session_start)
+            except Exception as e:
+                st.error(f"サンプルデータの読み込みエラー: {e}")
+            else:
+                st.session_state.ships = ships
+                st.session_state._ship_by_id = {s.id: s for s in ships}
+                st.session_state.ports = ports
                 
-            st.success("✅ サンプルデータを読み込みました!")
-            st.rerun()
+                # シミュレーターにデータを追加
+                st.session_state.simulator = ShippingSimulator()
+                st.session_state.simulator.add_ships(ships)
+                st.session_state.simulator.add_ports(ports)
+                    
+                st.success("✅ サンプルデータを読み込みました!")
+                st.rerun()
         
         # 統計情報
         st.markdown("### 📊 現在の状況")
@@ -156,26 +286,17 @@ def main():
             st.metric("📈 平均優先度", f"{avg_priority:.1f}")
         
         # シミュレーション履歴
-        if st.session_state.simulation_history:
+        if len(st.session_state.simulation_history):
             st.markdown("### 📝 実行履歴")
             st.write(f"実行回数: {len(st.session_state.simulation_history)}")
             
             if st.button("🗑️ 履歴クリア"):
-                st.session_state.simulation_history = []
+                st.session_state.simulation_history = np.empty(0, dtype=HISTORY_DTYPE)
                 st.rerun()
     
     # メインコンテンツ
     if not st.session_state.ships or not st.session_state.ports:
-        st.markdown("""
-        <div class="simulator-card">
-            <h3>🚀 シミュレーター開始手順</h3>
-            <ol>
-                <li>👈 サイドバーの「サンプルデータ読み込み」ボタンをクリック</li>
-                <li>📊 データが読み込まれたら各タブでシミュレーションを実行</li>
-                <li>📈 結果を分析して最適解を確認</li>
-            </ol>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(GETTING_STARTED_HTML, unsafe_allow_html=True)
         return
     
     # タブ構成
@@ -209,11 +330,13 @@ def show_quick_simulation_tab():
         st.subheader("⚙️ シミュレーション設定")
         
         # 船舶選択
-        ship_options = [f"{ship.name} ({ship.id})" for ship in st.session_state.ships]
+        ship_by_id = st.session_state._ship_by_id
+        ship_options = [ship.id for ship in st.session_state.ships]
         selected_ships = st.multiselect(
             "🚢 対象船舶を選択:",
             ship_options,
-            default=ship_options[:3] if len(ship_options) >= 3 else ship_options
+            default=ship_options[:3] if len(ship_options) >= 3 else ship_options,
+            format_func=lambda ship_id: f"{ship_by_id[ship_id].name} ({ship_id})"
         )
         
         # シミュレーションパラメータ
@@ -231,10 +354,7 @@ def show_quick_simulation_tab():
             if selected_ships:
                 with st.spinner("🔄 最適配船を計算中..."):
                     # 選択された船舶を取得
-                    selected_ship_ids = [name.split("(")[1].rstrip(")") 
-                                       for name in selected_ships]
-                    ships_to_simulate = [s for s in st.session_state.ships 
-                                       if s.id in selected_ship_ids]
+                    ships_to_simulate = [ship_by_id[ship_id] for ship_id in selected_ships]
                     
                     # シミュレーション実行
                     result = st.session_state.simulator.run_optimization(
@@ -247,12 +367,15 @@ def show_quick_simulation_tab():
                     st.session_state.simulation_results = result
                     
                     # 履歴に追加
-                    st.session_state.simulation_history.append({
-                        'timestamp': datetime.now(),
-                        'ships_count': len(ships_to_simulate),
-                        'method': optimization_method,
-                        'total_cost': result.get('total_cost', 0) if result else 0
-                    })
+                    history_entry = np.array([(
+                        np.datetime64(datetime.now(), 'ns'),
+                        len(ships_to_simulate),
+                        optimization_method,
+                        result.get('total_cost', 0) if result else 0
+                    )], dtype=HISTORY_DTYPE)
+                    st.session_state.simulation_history = np.concatenate(
+                        [st.session_state.simulation_history, history_entry]
+                    )
                 
                 st.markdown('<div class="success-banner">✅ シミュレーション完了!</div>', 
                            unsafe_allow_html=True)
@@ -303,11 +426,7 @@ def show_quick_simulation_tab():
                         # 費用内訳の可視化
                         costs = allocation.get('cost_breakdown', {})
                         if costs:
-                            fig_costs = px.pie(
-                                values=list(costs.values()),
-                                names=list(costs.keys()),
-                                title=f"{ship_id} 費用内訳"
-                            )
+                            fig_costs = build_cost_breakdown_pie(ship_id, tuple(costs.items()))
                             st.plotly_chart(fig_costs, use_container_width=True)
         else:
             st.info("📝 シミュレーションを実行すると結果がここに表示されます")
@@ -316,6 +435,9 @@ def show_detailed_dashboard_tab():
     """詳細ダッシュボードタブ"""
     st.header("📊 詳細ダッシュボード")
     
+    ships = st.session_state.ships
+    priorities = np.fromiter((s.priority for s in ships), dtype=np.int64, count=len(ships))
+    
     # KPIメトリクス行
     col1, col2, col3, col4, col5 = st.columns(5)
     
@@ -333,7 +455,7 @@ def show_detailed_dashboard_tab():
             st.metric("配船成功率", f"{success_rate:.1f}%")
     
     with col4:
-        avg_priority = np.mean([s.priority for s in st.session_state.ships]) if st.session_state.ships else 0
+        avg_priority = priorities.mean() if priorities.size else 0
         st.metric("平均優先度", f"{avg_priority:.1f}")
     
     with col5:
@@ -346,68 +468,37 @@ def show_detailed_dashboard_tab():
         
         with col1:
             # 船舶の貨物種別分布
-            cargo_types = [ship.cargo_type for ship in st.session_state.ships]
-            cargo_counts = pd.Series(cargo_types).value_counts()
-            
-            fig_pie = px.pie(
-                values=cargo_counts.values, 
-                names=cargo_counts.index,
-                title="🚢 貨物種別分布",
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
+            cargo_types = tuple(ship.cargo_type for ship in ships)
+            fig_pie = build_cargo_pie(cargo_types)
             st.plotly_chart(fig_pie, use_container_width=True)
         
         with col2:
             # 船舶サイズと優先度の散布図
-            ship_data = pd.DataFrame([
-                {
-                    'name': s.name, 
-                    'length': s.length, 
-                    'width': s.width, 
-                    'priority': s.priority,
-                    'cargo_type': s.cargo_type
-                }
-                for s in st.session_state.ships
-            ])
+            ship_data = pd.DataFrame({
+                'name': [s.name for s in ships],
+                'length': np.fromiter((s.length for s in ships), dtype=np.float64, count=len(ships)),
+                'width': np.fromiter((s.width for s in ships), dtype=np.float64, count=len(ships)),
+                'priority': priorities,
+                'cargo_type': [s.cargo_type for s in ships]
+            })
             
-            fig_scatter = px.scatter(
-                ship_data, 
-                x='length', 
-                y='width', 
-                size='priority',
-                color='cargo_type',
-                hover_name='name',
-                title="📏 船舶サイズ分布",
-                labels={'length': '船長(m)', 'width': '船幅(m)'}
-            )
+            fig_scatter = build_ship_size_scatter(ship_data)
             st.plotly_chart(fig_scatter, use_container_width=True)
         
         # 時系列分析
-        if st.session_state.simulation_history:
+        if len(st.session_state.simulation_history):
             st.markdown("### 📈 シミュレーション履歴分析")
             
-            history_df = pd.DataFrame(st.session_state.simulation_history)
-            history_df['timestamp'] = pd.to_datetime(history_df['timestamp'])
+            # timestampは既にdatetime64のため変換不要
+            history_df = pd.DataFrame.from_records(st.session_state.simulation_history)
             
+            fig_timeline, fig_ships = build_history_charts(history_df)
             col_a, col_b = st.columns(2)
             
             with col_a:
-                fig_timeline = px.line(
-                    history_df, 
-                    x='timestamp', 
-                    y='total_cost',
-                    title="💰 総費用推移",
-                    markers=True
-                )
                 st.plotly_chart(fig_timeline, use_container_width=True)
             
             with col_b:
-                fig_ships = px.bar(
-                    history_df, 
-                    x='timestamp', 
-                    y='ships_count',
-                    title="🚢 処理船舶数推移"
-                )
                 st.plotly_chart(fig_ships, use_container_width=True)
 
 def show_settings_management_tab():
@@ -449,6 +540,7 @@ def show_settings_management_tab():
                         )
                         
                         st.session_state.ships.append(new_ship)
+                        st.session_state._ship_by_id[new_ship.id] = new_ship
                         st.session_state.simulator.add_ship(new_ship)
                         st.success(f"✅ 船舶 {ship_name} を登録しました!")
                         st.rerun()
@@ -459,19 +551,17 @@ def show_settings_management_tab():
         if st.session_state.ships:
             st.subheader("📋 登録済み船舶一覧")
             
-            ships_df = pd.DataFrame([
-                {
-                    'ID': s.id,
-                    '船名': s.name,
-                    '船長(m)': s.length,
-                    '船幅(m)': s.width,
-                    '喫水(m)': s.draft,
-                    '貨物種別': s.cargo_type,
-                    '優先度': s.priority,
-                    'ETA': s.eta.strftime("%m/%d %H:%M")
-                }
-                for s in st.session_state.ships
-            ])
+            ships = st.session_state.ships
+            ships_df = pd.DataFrame({
+                'ID': [s.id for s in ships],
+                '船名': [s.name for s in ships],
+                '船長(m)': np.fromiter((s.length for s in ships), dtype=np.float64, count=len(ships)),
+                '船幅(m)': np.fromiter((s.width for s in ships), dtype=np.float64, count=len(ships)),
+                '喫水(m)': np.fromiter((s.draft for s in ships), dtype=np.float64, count=len(ships)),
+                '貨物種別': [s.cargo_type for s in ships],
+                '優先度': np.fromiter((s.priority for s in ships), dtype=np.int64, count=len(ships)),
+                'ETA': [s.eta.strftime("%m/%d %H:%M") for s in ships]
+            })
             
             # データフレーム表示（編集可能）
             edited_ships = st.data_editor(
@@ -481,7 +571,7 @@ def show_settings_management_tab():
             )
             
             # CSV出力
-            csv = ships_df.to_csv(index=False).encode('utf-8')
+            csv = dataframe_to_csv_bytes(ships_df)
             st.download_button(
                 label="📥 船舶データCSV出力",
                 data=csv,
@@ -590,30 +680,16 @@ def show_analysis_report_tab():
             })
         
         df = pd.DataFrame(allocation_data)
+        fig_port_costs, fig_waiting = build_allocation_charts(df)
         
         col1, col2 = st.columns(2)
         
         with col1:
             # 港湾別費用分析
-            port_costs = df.groupby('port')['total_cost'].sum().reset_index()
-            fig_port_costs = px.bar(
-                port_costs, 
-                x='port', 
-                y='total_cost',
-                title="🏭 港湾別総費用",
-                labels={'total_cost': '総費用(¥)', 'port': '港湾'}
-            )
             st.plotly_chart(fig_port_costs, use_container_width=True)
         
         with col2:
             # 待機時間分析
-            fig_waiting = px.box(
-                df, 
-                x='port', 
-                y='waiting_time',
-                title="⏰ 港湾別待機時間分布",
-                labels={'waiting_time': '待機時間(h)', 'port': '港湾'}
-            )
             st.plotly_chart(fig_waiting, use_container_width=True)
         
         # 詳細データテーブル
@@ -0,0 +1,143 @@
+import math
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba未インストール時はNumPy実装を使用
+    NUMBA_AVAILABLE = False
+
+EARTH_RADIUS_KM = 6371.0  # 地球半径(km)
+KNOT_TO_KMH = 1.852  # 1ノット = 1.852 km/h
+
+# シミュレーションイベント種別のコード
+EVENT_DEPARTURE = 0
+EVENT_ARRIVAL = 1
+
+def haversine_matrix(lat1: np.ndarray, lon1: np.ndarray,
+                     lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """2組の座標間の距離行列を計算（haversine, km, 入力と同じ精度）"""
+    lat1 = np.radians(lat1)
+    lon1 = np.radians(lon1)
+    lat2 = np.radians(lat2)
+    lon2 = np.radians(lon2)
+    dlat = lat1[:, None] - lat2[None, :]
+    dlon = lon1[:, None] - lon2[None, :]
+    a = np.sin(dlat / 2)**2 + np.cos(lat1)[:, None] * np.cos(lat2)[None, :] * np.sin(dlon / 2)**2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(a))
+
+def haversine_term(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """haversine式の中間項 a を計算（要素ごと, ブロードキャスト可）
+
+    距離 = 2R·arcsin(√a) は a について単調増加のため、距離の大小比較だけなら
+    arcsin と平方根を省いて a を比較すればよい。
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lon1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lon2, dtype=np.float64))
+    return np.sin((lat1 - lat2) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon1 - lon2) / 2)**2
+
+def _pairwise_cost_numpy(lat_s, lon_s, spd_s, cargo_s, eta_s, prio_s,
+                         lat_p, lon_p, rate_p) -> np.ndarray:
+    """船舶×港湾のコスト行列を計算（NumPy実装）"""
+    dist = haversine_matrix(lat_s, lon_s, lat_p, lon_p)
+    travel = dist / (spd_s * KNOT_TO_KMH)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        handling = np.where(rate_p[None, :] > 0, cargo_s[:, None] / rate_p[None, :], np.inf)
+    return prio_s[:, None] * (eta_s[:, None] + travel + handling)
+
+if NUMBA_AVAILABLE:
+    # 処理能力0の港湾でinfを返すため、nnan/ninfを除いたfastmathフラグを使用
+    @njit(parallel=True, fastmath={'nsz', 'arcp', 'contract', 'afn', 'reassoc'}, cache=True)
+    def _pairwise_cost_numba(lat_s, lon_s, spd_s, cargo_s, eta_s, prio_s,
+                             lat_p, lon_p, rate_p):
+        """船舶×港湾のコスト行列を計算（Numba実装）"""
+        n_ships = lat_s.shape[0]
+        n_ports = lat_p.shape[0]
+        out = np.empty((n_ships, n_ports))
+        for i in prange(n_ships):
+            la1 = math.radians(lat_s[i])
+            lo1 = math.radians(lon_s[i])
+            cos_la1 = math.cos(la1)
+            speed_kmh = spd_s[i] * KNOT_TO_KMH
+            for j in range(n_ports):
+                la2 = math.radians(lat_p[j])
+                lo2 = math.radians(lon_p[j])
+                a = (math.sin((la1 - la2) / 2)**2
+                     + cos_la1 * math.cos(la2) * math.sin((lo1 - lo2) / 2)**2)
+                dist = EARTH_RADIUS_KM * 2 * math.asin(math.sqrt(a))
+                if rate_p[j] > 0:
+                    handling = cargo_s[i] / rate_p[j]
+                else:
+                    handling = np.inf
+                out[i, j] = prio_s[i] * (eta_s[i] + dist / speed_kmh + handling)
+        return out
+
+def pairwise_cost(lat_s, lon_s, spd_s, cargo_s, eta_s, prio_s,
+                  lat_p, lon_p, rate_p) -> np.ndarray:
+    """船舶×港湾のコスト行列を計算
+
+    コスト = 優先度 × (ETA[h] + 航行時間[h] + 荷役時間[h])
+    航行時間は船速(ノット)、荷役時間は貨物量(TEU)と港湾処理能力(TEU/h)から算出する。
+    """
+    args = [np.ascontiguousarray(a, dtype=np.float64)
+            for a in (lat_s, lon_s, spd_s, cargo_s, eta_s, prio_s, lat_p, lon_p, rate_p)]
+    if NUMBA_AVAILABLE:
+        return _pairwise_cost_numba(*args)
+    return _pairwise_cost_numpy(*args)
+
+def _accumulate_events_numpy(etype, sidx, pidx, vol, dist, fuel, n_ships, n_ports):
+    """イベント列から港湾・船舶別の統計を集計（NumPy実装）"""
+    arrival = etype == EVENT_ARRIVAL
+    a_ship = sidx[arrival]
+    a_port = pidx[arrival]
+    a_vol = vol[arrival]
+    a_dist = dist[arrival]
+    port_ships = np.bincount(a_port, minlength=n_ports).astype(np.int64)
+    port_cargo = np.bincount(a_port, weights=a_vol, minlength=n_ports)
+    ship_dist = np.bincount(a_ship, weights=a_dist, minlength=n_ships)
+    ship_cargo = np.bincount(a_ship, weights=a_vol, minlength=n_ships)
+    ship_fuel = np.bincount(a_ship, weights=fuel[arrival], minlength=n_ships)
+    last_event = np.full(n_ships, -1, dtype=np.int64)
+    np.maximum.at(last_event, sidx, np.arange(len(sidx), dtype=np.int64))
+    return port_ships, port_cargo, ship_dist, ship_cargo, ship_fuel, last_event
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _accumulate_events_numba(etype, sidx, pidx, vol, dist, fuel, n_ships, n_ports):
+        """イベント列から港湾・船舶別の統計を集計（Numba実装）"""
+        port_ships = np.zeros(n_ports, dtype=np.int64)
+        port_cargo = np.zeros(n_ports, dtype=np.float64)
+        ship_dist = np.zeros(n_ships, dtype=np.float64)
+        ship_cargo = np.zeros(n_ships, dtype=np.float64)
+        ship_fuel = np.zeros(n_ships, dtype=np.float64)
+        last_event = np.full(n_ships, -1, dtype=np.int64)
+        for i in range(etype.shape[0]):
+            s = sidx[i]
+            last_event[s] = i
+            if etype[i] == EVENT_ARRIVAL:
+                p = pidx[i]
+                port_ships[p] += 1
+                port_cargo[p] += vol[i]
+                ship_dist[s] += dist[i]
+                ship_cargo[s] += vol[i]
+                ship_fuel[s] += fuel[i]
+        return port_ships, port_cargo, ship_dist, ship_cargo, ship_fuel, last_event
+
+def accumulate_events(etype, sidx, pidx, vol, dist, fuel, n_ships, n_ports):
+    """時系列順のイベント列から港湾・船舶別の統計を集計
+
+    到着イベントごとに港湾の取扱隻数・貨物量、船舶の航行距離・輸送量・燃料消費量を
+    加算する。各船舶の最後のイベント位置（なければ-1）も返す。
+    """
+    args = (np.ascontiguousarray(etype, dtype=np.int8),
+            np.ascontiguousarray(sidx, dtype=np.int32),
+            np.ascontiguousarray(pidx, dtype=np.int32),
+            np.ascontiguousarray(vol, dtype=np.float64),
+            np.ascontiguousarray(dist, dtype=np.float64),
+            np.ascontiguousarray(fuel, dtype=np.float64),
+            int(n_ships), int(n_ports))
+    if NUMBA_AVAILABLE:
+        return _accumulate_events_numba(*args)
+    return _accumulate_events_numpy(*args)
@@ -1,17 +1,67 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterable
 from datetime import datetime, timedelta
+from .kernels import haversine_matrix, haversine_term, pairwise_cost
+
+BITMAP_MAX_BERTHS = 64  # ビットマップで空き判定するバース数の上限
+COORD_DTYPE = np.float64  # 座標配列の精度（単精度は長距離で距離誤差が大きいため倍精度）
 
 class Berth:
-    def __init__(self, berth_id: str, capacity: float, handling_rate: float):
+    # 処理能力・容量・占有状態はプロパティ経由で参照するため実体は _ 付きで保持
+    __slots__ = ('_port', 'berth_id', '_capacity', '_handling_rate', '_is_occupied',
+                 'current_ship', 'queue')
+    
+    def __init__(self, berth_id: str, capacity: float, handling_rate: float,
+                 is_occupied: bool = False, current_ship: Optional[str] = None):
+        # 登録先のPort（未登録時はNone）
+        self._port = None
         self.berth_id = berth_id
         self.capacity = capacity  # TEU
         self.handling_rate = handling_rate  # TEU/hour
-        self.is_occupied = False
-        self.current_ship = None
+        self.is_occupied = is_occupied
+        self.current_ship = current_ship
         self.queue = []
-        
+    
+    def __repr__(self) -> str:
+        return (f"Berth(berth_id={self.berth_id!r}, capacity={self.capacity!r}, "
+                f"handling_rate={self.handling_rate!r}, is_occupied={self.is_occupied!r}, "
+                f"current_ship={self.current_ship!r})")
+    
+    # 処理能力・容量・占有状態は登録先PortのSoA配列にも書き込む
+    @property
+    def capacity(self) -> float:
+        return self._capacity
+    
+    @capacity.setter
+    def capacity(self, value: float):
+        self._capacity = value
+        if self._port is not None:
+            self._port._cap[self._port._berth_idx[self.berth_id]] = value
+    
+    @property
+    def handling_rate(self) -> float:
+        return self._handling_rate
+    
+    @handling_rate.setter
+    def handling_rate(self, value: float):
+        if self._port is not None:
+            port = self._port
+            row = port._berth_idx[self.berth_id]
+            port._total_capacity += value - port._rate[row]
+            port._rate[row] = value
+        self._handling_rate = value
+    
+    @property
+    def is_occupied(self) -> bool:
+        return self._is_occupied
+    
+    @is_occupied.setter
+    def is_occupied(self, value: bool):
+        self._is_occupied = value
+        if self._port is not None:
+            self._port._set_occupied(self._port._berth_idx[self.berth_id], value)
+    
     def to_dict(self) -> Dict:
         return {
             'berth_id': self.berth_id,
@@ -22,11 +72,19 @@ class Berth:
         }
 
 class Port:
+    # 緯度・経度はプロパティ経由で参照するため実体は _ 付きで保持
+    __slots__ = ('_manager', 'port_id', 'name', '_latitude', '_longitude', 'berths',
+                 'waiting_queue', 'statistics', '_berth_ids', '_berth_idx', '_rate', '_cap',
+                 '_occ', '_occ_mask', '_full_mask', '_total_capacity')
+    
     def __init__(self, port_id: str, name: str, latitude: float, longitude: float):
+        # 登録先のPortManager（未登録時はNone）
+        self._manager = None
         self.port_id = port_id
         self.name = name
         self.latitude = latitude
         self.longitude = longitude
+        # バースはSoA配列と同期させるため add_berth 経由でのみ追加する
         self.berths = {}
         self.waiting_queue = []
         self.statistics = {
@@ -34,21 +92,168 @@ class Port:
             'total_cargo_handled': 0,
             'average_waiting_time': 0
         }
+        # バース情報をSoA形式で保持（行番号は _berth_ids の並び順）
+        self._berth_ids = []
+        self._berth_idx = {}  # berth_id -> 行番号
+        self._rate = np.empty(0, dtype=np.float64)
+        self._cap = np.empty(0, dtype=np.float64)
+        self._occ = np.empty(0, dtype=bool)
+        # 使用中バースのビットマップ（bit i = 行番号iのバース）
+        self._occ_mask = 0
+        self._full_mask = 0
+        # 総処理能力（バースの追加・削除時に差分更新）
+        self._total_capacity = 0.0
+    
+    def __repr__(self) -> str:
+        return (f"Port(port_id={self.port_id!r}, name={self.name!r}, latitude={self.latitude!r}, "
+                f"longitude={self.longitude!r}, berths={self.berths!r})")
+    
+    # 緯度・経度は登録先PortManagerの座標配列にも書き込み、距離行列キャッシュを無効化する
+    @property
+    def latitude(self) -> float:
+        return self._latitude
+    
+    @latitude.setter
+    def latitude(self, value: float):
+        self._latitude = value
+        if self._manager is not None:
+            self._manager._update_coordinates(self)
+    
+    @property
+    def longitude(self) -> float:
+        return self._longitude
+    
+    @longitude.setter
+    def longitude(self, value: float):
+        self._longitude = value
+        if self._manager is not None:
+            self._manager._update_coordinates(self)
+    
+    def _set_occupied(self, row: int, occupied: bool):
+        """占有状態の配列とビットマップを更新"""
+        self._occ[row] = occupied
+        if occupied:
+            self._occ_mask |= 1 << row
+        else:
+            self._occ_mask &= ~(1 << row)
+    
+    def _check_unbound(self, berth: Berth):
+        """バースが他の港湾に登録されていないことを確認"""
+        if berth._port is not None and berth._port is not self:
+            raise ValueError(f"バース {berth.berth_id} は別の港湾に登録済みです")
     
     def add_berth(self, berth: Berth):
         """バースを追加"""
+        self._check_unbound(berth)
+        if berth.berth_id in self.berths:
+            # 同一IDは上書き（置き換えられたバースの紐付けを解除）
+            self.berths[berth.berth_id]._port = None
+            row = self._berth_idx[berth.berth_id]
+            self._total_capacity += berth.handling_rate - self._rate[row]
+            self._rate[row] = berth.handling_rate
+            self._cap[row] = berth.capacity
+        else:
+            row = len(self._berth_ids)
+            self._berth_ids.append(berth.berth_id)
+            self._berth_idx[berth.berth_id] = row
+            self._rate = np.append(self._rate, berth.handling_rate)
+            self._cap = np.append(self._cap, berth.capacity)
+            self._occ = np.append(self._occ, False)
+            self._full_mask |= 1 << row
+            self._total_capacity += berth.handling_rate
+        self._set_occupied(row, berth.is_occupied)
         self.berths[berth.berth_id] = berth
+        berth._port = self
+    
+    def extend_berths(self, berths: Iterable[Berth]):
+        """バースを一括追加"""
+        pending = {}
+        for berth in berths:
+            self._check_unbound(berth)
+            if berth.berth_id in self.berths:
+                self.add_berth(berth)  # 既存IDは個別に上書き
+            else:
+                pending[berth.berth_id] = berth
+        if not pending:
+            return
+        
+        # SoA配列・ビットマップ・総処理能力の更新はまとめて1回だけ行う
+        new_berths = list(pending.values())
+        count = len(new_berths)
+        start = len(self._berth_ids)
+        rates = np.fromiter((b.handling_rate for b in new_berths), dtype=np.float64, count=count)
+        capacities = np.fromiter((b.capacity for b in new_berths), dtype=np.float64, count=count)
+        occupied = np.fromiter((b.is_occupied for b in new_berths), dtype=bool, count=count)
+        
+        self._berth_idx.update({berth_id: start + i for i, berth_id in enumerate(pending)})
+        self._berth_ids.extend(pending)
+        self._rate = np.concatenate([self._rate, rates])
+        self._cap = np.concatenate([self._cap, capacities])
+        self._occ = np.concatenate([self._occ, occupied])
+        self._full_mask = (1 << len(self._berth_ids)) - 1
+        for row in np.flatnonzero(occupied):
+            self._occ_mask |= 1 << (start + int(row))
+        self._total_capacity += rates.sum()
+        self.berths.update(pending)
+        for berth in new_berths:
+            berth._port = self
+    
+    def remove_berth(self, berth_id: str) -> bool:
+        """バースを削除"""
+        berth = self.berths.pop(berth_id, None)
+        if berth is None:
+            return False
+        berth._port = None
+        row = self._berth_idx.pop(berth_id)
+        del self._berth_ids[row]
+        for i in range(row, len(self._berth_ids)):
+            self._berth_idx[self._berth_ids[i]] = i
+        self._total_capacity -= self._rate[row]
+        self._rate = np.delete(self._rate, row)
+        self._cap = np.delete(self._cap, row)
+        self._occ = np.delete(self._occ, row)
+        # 削除した行より上位のビットを1つ下にずらす
+        low_bits = (1 << row) - 1
+        self._occ_mask = (self._occ_mask & low_bits) | ((self._occ_mask >> (row + 1)) << row)
+        self._full_mask = (1 << len(self._berth_ids)) - 1
+        return True
+    
+    def occupy_berth(self, berth_id: str, ship_id: str) -> bool:
+        """バースを使用中にする"""
+        berth = self.berths.get(berth_id)
+        if not berth or berth.is_occupied:
+            return False
+        berth.is_occupied = True  # SoA配列・ビットマップにも反映される
+        berth.current_ship = ship_id
+        return True
+    
+    def release_berth(self, berth_id: str) -> bool:
+        """バースを解放"""
+        berth = self.berths.get(berth_id)
+        if not berth or not berth.is_occupied:
+            return False
+        berth.is_occupied = False  # SoA配列・ビットマップにも反映される
+        berth.current_ship = None
+        return True
     
     def get_available_berth(self) -> Optional[Berth]:
         """利用可能なバースを取得"""
-        for berth in self.berths.values():
-            if not berth.is_occupied:
-                return berth
-        return None
+        if len(self._berth_ids) <= BITMAP_MAX_BERTHS:
+            free_mask = ~self._occ_mask & self._full_mask
+            if not free_mask:
+                return None
+            # 最下位の空きビットの位置 = 最初の空きバースの行番号
+            row = (free_mask & -free_mask).bit_length() - 1
+            return self.berths[self._berth_ids[row]]
+        
+        free = np.flatnonzero(~self._occ)
+        if free.size == 0:
+            return None
+        return self.berths[self._berth_ids[free[0]]]
     
     def get_total_capacity(self) -> float:
         """総処理能力を取得"""
-        return sum(berth.handling_rate for berth in self.berths.values())
+        return float(self._total_capacity)
     
     def to_dict(self) -> Dict:
         return {
@@ -63,20 +268,111 @@ class Port:
 class PortManager:
     def __init__(self):
         self.ports = {}
+        # 座標をSoA形式で保持（行番号は self.ports の並び順と一致）
+        self._lat = np.empty(0, dtype=COORD_DTYPE)
+        self._lon = np.empty(0, dtype=COORD_DTYPE)
+        self._idx = {}  # port_id -> 行番号
+        self._ports_by_row = []  # 行番号 -> Port
+        # 距離行列キャッシュ（港湾の追加・削除時に無効化）
+        self._dist_cache = None
+        self._dist_dirty = True
+    
+    def _invalidate_distances(self):
+        """距離行列キャッシュを無効化"""
+        self._dist_dirty = True
+    
+    def _can_bind(self, port: Port) -> bool:
+        """港湾をこのマネージャーに紐付け可能か（港湾は1つのPortManagerにのみ登録できる）"""
+        return port._manager is None or port._manager is self
+    
+    def _update_coordinates(self, port: Port):
+        """港湾の座標変更を座標配列に反映し、距離行列キャッシュを無効化"""
+        row = self._idx.get(port.port_id)
+        if row is None or self._ports_by_row[row] is not port:
+            return
+        self._lat[row] = port.latitude
+        self._lon[row] = port.longitude
+        self._invalidate_distances()
     
     def add_port(self, port: Port) -> bool:
         """港湾を追加"""
-        if port.port_id in self.ports:
+        if not self._can_bind(port):
+            return False
+        # setdefaultでIDの存在確認と登録を1回のハッシュ探索で行う
+        # （同一インスタンスの再登録も弾くため件数の変化で判定）
+        count = len(self.ports)
+        self.ports.setdefault(port.port_id, port)
+        if len(self.ports) == count:
             return False
-        self.ports[port.port_id] = port
+        self._idx[port.port_id] = len(self._lat)
+        self._ports_by_row.append(port)
+        self._lat = np.append(self._lat, COORD_DTYPE(port.latitude))
+        self._lon = np.append(self._lon, COORD_DTYPE(port.longitude))
+        port._manager = self
+        self._invalidate_distances()
         return True
     
+    def add_ports(self, ports: Iterable[Port]) -> int:
+        """港湾を一括追加（追加件数を返す）"""
+        added = []
+        for port in ports:
+            if not self._can_bind(port):
+                continue
+            count = len(self.ports)
+            self.ports.setdefault(port.port_id, port)
+            if len(self.ports) > count:
+                added.append(port)
+        if not added:
+            return 0
+        
+        # 座標配列の拡張とキャッシュ無効化はまとめて1回だけ行う
+        start = len(self._lat)
+        self._idx.update({port.port_id: start + i for i, port in enumerate(added)})
+        self._ports_by_row.extend(added)
+        for port in added:
+            port._manager = self
+        self._lat = np.concatenate([
+            self._lat, np.fromiter((p.latitude for p in added), dtype=COORD_DTYPE, count=len(added))
+        ])
+        self._lon = np.concatenate([
+            self._lon, np.fromiter((p.longitude for p in added), dtype=COORD_DTYPE, count=len(added))
+        ])
+        self._invalidate_distances()
+        return len(added)
+    
     def remove_port(self, port_id: str) -> bool:
         """港湾を削除"""
-        if port_id in self.ports:
-            del self.ports[port_id]
+        port = self.ports.pop(port_id, None)
+        if port is None:
+            return False
+        if port._manager is self:
+            port._manager = None
+        row = self._idx.pop(port_id, None)
+        if row is None:
+            # self.ports に直接追加された港湾は座標配列に行がないため再構築する
+            self._rebuild_coordinates()
             return True
-        return False
+        self._lat = np.delete(self._lat, row)
+        self._lon = np.delete(self._lon, row)
+        del self._ports_by_row[row]
+        self._idx = {port.port_id: i for i, port in enumerate(self._ports_by_row)}
+        self._invalidate_distances()
+        return True
+    
+    def _rebuild_coordinates(self):
+        """座標配列を self.ports から再構築"""
+        for port in self._ports_by_row:
+            if port._manager is self:
+                port._manager = None
+        ports = self.ports.values()
+        self._lat = np.fromiter((p.latitude for p in ports), dtype=COORD_DTYPE, count=len(self.ports))
+        self._lon = np.fromiter((p.longitude for p in ports), dtype=COORD_DTYPE, count=len(self.ports))
+        self._idx = {pid: i for i, pid in enumerate(self.ports)}
+        self._ports_by_row = list(ports)
+        for port in self._ports_by_row:
+            if port._manager is None:
+                port._manager = self
+        self._invalidate_distances()
     
     def get_port(self, port_id: str) -> Optional[Port]:
         """港湾を取得"""
@@ -86,43 +382,106 @@ class PortManager:
         """全港湾を取得"""
         return list(self.ports.values())
     
+    def get_port_index(self) -> Dict[str, int]:
+        """port_id -> 距離行列の行番号の対応表を取得"""
+        return dict(self._idx)
+    
+    def distance_matrix(self) -> np.ndarray:
+        """全港湾間の距離行列を取得（haversine, km）"""
+        if self._dist_dirty or self._dist_cache is None:
+            self._dist_cache = self._compute_distance_matrix()
+            self._dist_cache.setflags(write=False)  # 共有キャッシュのため読み取り専用
+            self._dist_dirty = False
+        return self._dist_cache
+    
+    def _compute_distance_matrix(self) -> np.ndarray:
+        """全港湾間の距離行列を計算"""
+        return haversine_matrix(self._lat, self._lon, self._lat, self._lon)
+    
+    def cost_matrix(self, latitudes: np.ndarray, longitudes: np.ndarray, speeds: np.ndarray,
+                    cargo_volumes: np.ndarray, eta_hours: np.ndarray,
+                    priorities: np.ndarray) -> np.ndarray:
+        """船舶×港湾の配船コスト行列を計算（行: 船舶, 列: self.ports の並び順）"""
+        rates = np.fromiter((port.get_total_capacity() for port in self.ports.values()),
+                            dtype=np.float64, count=len(self.ports))
+        return pairwise_cost(latitudes, longitudes, speeds, cargo_volumes, eta_hours, priorities,
+                             self._lat, self._lon, rates)
+    
     def calculate_distance(self, port1_id: str, port2_id: str) -> float:
-        """港湾間の距離を計算（簡易計算）"""
-        port1 = self.get_port(port1_id)
-        port2 = self.get_port(port2_id)
+        """港湾間の距離を計算"""
+        row1 = self._idx.get(port1_id)
+        row2 = self._idx.get(port2_id)
         
-        if not port1 or not port2:
+        if row1 is None or row2 is None:
             return 0
         
-        # 簡易的な距離計算（実際はより正確な計算が必要）
-        lat_diff = port1.latitude - port2.latitude
-        lon_diff = port1.longitude - port2.longitude
-        distance = np.sqrt(lat_diff**2 + lon_diff**2) * 111  # km
-        return distance
+        return float(self.distance_matrix()[row1, row2])
+    
+    def distance_key(self, port1_id: str, port2_id: str) -> float:
+        """港湾間距離の比較用キー（haversine の中間項 a）を計算
+
+        大圏距離について単調増加のため、大小比較のみが必要な場合に
+        arcsin・平方根の計算を省略するために使用する。
+        """
+        row1 = self._idx.get(port1_id)
+        row2 = self._idx.get(port2_id)
+        
+        if row1 is None or row2 is None:
+            return 0
+        
+        return float(haversine_term(self._lat[row1], self._lon[row1], self._lat[row2], self._lon[row2]))
+    
+    def nearest_port(self, latitude: float, longitude: float) -> Optional[Port]:
+        """指定座標に最も近い港湾を取得（大圏距離で比較）"""
+        if not self._ports_by_row:
+            return None
+        keys = haversine_term(latitude, longitude, self._lat, self._lon)
+        return self._ports_by_row[int(np.argmin(keys))]
     
     def to_dataframe(self) -> pd.DataFrame:
         """DataFrame形式で出力"""
-        data = [port.to_dict() for port in self.ports.values()]
-        return pd.DataFrame(data)
+        ports = self.ports.values()
+        return pd.DataFrame({
+            'port_id': list(self.ports),
+            'name': [port.name for port in ports],
+            'latitude': [port.latitude for port in ports],
+            'longitude': [port.longitude for port in ports],
+            'berth_count': np.fromiter((len(port.berths) for port in ports),
+                                       dtype=np.int64, count=len(self.ports)),
+            'total_capacity': np.fromiter((port.get_total_capacity() for port in ports),
+                                          dtype=np.float64, count=len(self.ports))
+        })
     
     def from_dataframe(self, df: pd.DataFrame):
         """DataFrameから港湾データを読み込み"""
         self.ports = {}
-        for _, row in df.iterrows():
+        # 行ごとのSeries生成を避けるため列単位で取り出す
+        port_ids = df['port_id'].astype(str).to_numpy()
+        names = df['name'].astype(str).to_numpy()
+        latitudes = df['latitude'].to_numpy(dtype=np.float64)
+        longitudes = df['longitude'].to_numpy(dtype=np.float64)
+        if 'berth_count' in df.columns:
+            berth_counts = df['berth_count'].fillna(0).to_numpy(dtype=np.int64)
+        else:
+            berth_counts = np.zeros(len(df), dtype=np.int64)
+        
+        for port_id, name, latitude, longitude, berth_count in zip(
+                port_ids, names, latitudes, longitudes, berth_counts):
             port = Port(
-                port_id=str(row['port_id']),
-                name=str(row['name']),
-                latitude=float(row['latitude']),
-                longitude=float(row['longitude'])
+                port_id=str(port_id),
+                name=str(name),
+                latitude=float(latitude),
+                longitude=float(longitude)
             )
             # バース情報がある場合は追加
-            if 'berth_count' in row and pd.notna(row['berth_count']):
-                for i in range(int(row['berth_count'])):
-                    berth = Berth(
-                        berth_id=f"{port.port_id}_B{i+1}",
-                        capacity=100,  # デフォルト値
-                        handling_rate=20  # デフォルト値
-                    )
-                    port.add_berth(berth)
+            port.extend_berths(
+                Berth(
+                    berth_id=f"{port.port_id}_B{i+1}",
+                    capacity=100,  # デフォルト値
+                    handling_rate=20  # デフォルト値
+                )
+                for i in range(berth_count)
+            )
             
             self.ports[port.port_id] = port
+        self._rebuild_coordinates()
@@ -1,12 +1,43 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Iterable
 import json
+import operator
+
+# 船舶ステータスとSoA配列に格納するコード
+SHIP_STATUSES = ('Available', 'In Transit', 'Loading', 'Unloading', 'Scheduled')
+STATUS_CODES = {status: code for code, status in enumerate(SHIP_STATUSES)}
+
+# 寄港履歴配列の初期容量
+HISTORY_INITIAL_SIZE = 16
+
+# CSV読み込み時の列の型（数値はSoA配列と同じfloat64で精度を保つ）
+CSV_DTYPES = {
+    'ship_id': str,
+    'name': str,
+    'capacity': np.float64,
+    'speed': np.float64,
+    'fuel_consumption': np.float64,
+    'ship_type': 'category'
+}
 
 class Ship:
+    # 容量・速度・燃費・ステータスはプロパティ経由で参照するため実体は _ 付きで保持
+    __slots__ = ('_manager', '_row', 'ship_id', 'name', '_capacity', '_speed', '_fuel_consumption',
+                 'ship_type', 'current_location', '_status', 'cargo',
+                 '_history_ts', '_history_port', '_history_len')
+    
+    # to_dict で出力する属性名
+    FIELDS = ('ship_id', 'name', 'capacity', 'speed', 'fuel_consumption', 'ship_type',
+              'current_location', 'status', 'cargo')
+    _get_fields = operator.attrgetter(*FIELDS)
+    
     def __init__(self, ship_id: str, name: str, capacity: float, speed: float, 
                  fuel_consumption: float, ship_type: str = "Container"):
+        # 登録先のShipManagerと行番号（未登録時はNone）
+        self._manager = None
+        self._row = -1
         self.ship_id = ship_id
         self.name = name
         self.capacity = capacity  # TEU
@@ -14,38 +45,161 @@ class Ship:
         self.fuel_consumption = fuel_consumption  # L/hour
         self.ship_type = ship_type
         self.current_location = None
-        self.status = "Available"  # Available, In Transit, Loading, Unloading
+        self.status = "Available"  # SHIP_STATUSES のいずれか
         self.cargo = 0
-        self.route_history = []
+        # 寄港履歴（時刻と港湾の行番号）は配列に保持し、満杯時に容量を倍にする
+        # （配列は最初の追加時に確保する）
+        self._history_ts = None
+        self._history_port = None
+        self._history_len = 0
+    
+    # 容量・速度・燃費・ステータスは登録先ShipManagerのSoA配列にも書き込む
+    @property
+    def capacity(self) -> float:
+        return self._capacity
+    
+    @capacity.setter
+    def capacity(self, value: float):
+        self._capacity = value
+        if self._manager is not None:
+            self._manager._capacity[self._row] = value
+    
+    @property
+    def speed(self) -> float:
+        return self._speed
+    
+    @speed.setter
+    def speed(self, value: float):
+        self._speed = value
+        if self._manager is not None:
+            self._manager._speed[self._row] = value
+    
+    @property
+    def fuel_consumption(self) -> float:
+        return self._fuel_consumption
+    
+    @fuel_consumption.setter
+    def fuel_consumption(self, value: float):
+        self._fuel_consumption = value
+        if self._manager is not None:
+            self._manager._fuel[self._row] = value
+    
+    @property
+    def status(self) -> str:
+        return self._status
+    
+    @status.setter
+    def status(self, value: str):
+        code = STATUS_CODES.get(value)
+        if code is None:
+            raise ValueError(f"不明な船舶ステータスです: {value}")
+        self._status = value
+        if self._manager is not None:
+            self._manager._status[self._row] = code
 
+    def append_route_history(self, timestamp: datetime, port_idx: int):
+        """寄港履歴を追加（port_idx は PortManager.get_port_index の行番号）"""
+        if self._history_ts is None:
+            self._history_ts = np.empty(HISTORY_INITIAL_SIZE, dtype='datetime64[ns]')
+            self._history_port = np.empty(HISTORY_INITIAL_SIZE, dtype=np.int32)
+        elif self._history_len == len(self._history_ts):
+            size = 2 * self._history_len
+            self._history_ts = np.resize(self._history_ts, size)
+            self._history_port = np.resize(self._history_port, size)
+        self._history_ts[self._history_len] = np.datetime64(timestamp, 'ns')
+        self._history_port[self._history_len] = port_idx
+        self._history_len += 1
+    
+    @property
+    def route_history(self) -> pd.DataFrame:
+        """寄港履歴をDataFrameで取得"""
+        if self._history_ts is None:
+            return pd.DataFrame({
+                'timestamp': np.empty(0, dtype='datetime64[ns]'),
+                'port_idx': np.empty(0, dtype=np.int32)
+            })
+        return pd.DataFrame({
+            'timestamp': self._history_ts[:self._history_len],
+            'port_idx': self._history_port[:self._history_len]
+        })
+    
     def to_dict(self) -> Dict:
-        return {
-            'ship_id': self.ship_id,
-            'name': self.name,
-            'capacity': self.capacity,
-            'speed': self.speed,
-            'fuel_consumption': self.fuel_consumption,
-            'ship_type': self.ship_type,
-            'current_location': self.current_location,
-            'status': self.status,
-            'cargo': self.cargo
-        }
+        return dict(zip(self.FIELDS, self._get_fields(self)))
 
 class ShipManager:
     def __init__(self):
         self.ships = {}
+        # 船舶属性をSoA形式で保持（行番号は self.ships の並び順と一致）
+        self._ships_by_row = []
+        self._id_to_idx = {}  # ship_id -> 行番号
+        self._capacity = np.empty(0, dtype=np.float64)
+        self._speed = np.empty(0, dtype=np.float64)
+        self._fuel = np.empty(0, dtype=np.float64)
+        self._status = np.empty(0, dtype=np.int8)  # STATUS_CODES のコード
+    
+    def _append_rows(self, ships: List[Ship]):
+        """SoA配列に船舶を追加し、各船舶を行番号に紐付け"""
+        start = len(self._ships_by_row)
+        count = len(ships)
+        for i, ship in enumerate(ships):
+            ship._manager = self
+            ship._row = start + i
+            self._id_to_idx[ship.ship_id] = start + i
+        self._ships_by_row.extend(ships)
+        self._capacity = np.concatenate([
+            self._capacity, np.fromiter((s.capacity for s in ships), dtype=np.float64, count=count)
+        ])
+        self._speed = np.concatenate([
+            self._speed, np.fromiter((s.speed for s in ships), dtype=np.float64, count=count)
+        ])
+        self._fuel = np.concatenate([
+            self._fuel, np.fromiter((s.fuel_consumption for s in ships), dtype=np.float64, count=count)
+        ])
+        self._status = np.concatenate([
+            self._status, np.fromiter((STATUS_CODES[s.status] for s in ships), dtype=np.int8, count=count)
+        ])
+    
+    def _can_bind(self, ship: Ship) -> bool:
+        """船舶をこのマネージャーに紐付け可能か（船舶は1つのShipManagerにのみ登録できる）"""
+        return ship._manager is None or ship._manager is self
+    
+    def _rebuild(self):
+        """SoA配列を self.ships から再構築"""
+        for ship in self._ships_by_row:
+            if ship._manager is self:
+                ship._manager = None
+        self._ships_by_row = []
+        self._id_to_idx = {}
+        self._capacity = np.empty(0, dtype=np.float64)
+        self._speed = np.empty(0, dtype=np.float64)
+        self._fuel = np.empty(0, dtype=np.float64)
+        self._status = np.empty(0, dtype=np.int8)
+        self._append_rows(list(self.ships.values()))
         
     def add_ship(self, ship: Ship) -> bool:
         """船舶を追加"""
-        if ship.ship_id in self.ships:
+        if ship.ship_id in self.ships or not self._can_bind(ship):
             return False
         self.ships[ship.ship_id] = ship
+        self._append_rows([ship])
         return True
     
+    def add_ships(self, ships: Iterable[Ship]) -> int:
+        """船舶を一括追加（追加件数を返す）"""
+        added = []
+        for ship in ships:
+            if ship.ship_id not in self.ships and self._can_bind(ship):
+                self.ships[ship.ship_id] = ship
+                added.append(ship)
+        if added:
+            self._append_rows(added)
+        return len(added)
+    
     def remove_ship(self, ship_id: str) -> bool:
         """船舶を削除"""
         if ship_id in self.ships:
             del self.ships[ship_id]
+            self._rebuild()
             return True
         return False
     
@@ -59,10 +213,33 @@ class ShipManager:
     
     def get_ships_by_status(self, status: str) -> List[Ship]:
         """ステータス別に船舶を取得"""
-        return [ship for ship in self.ships.values() if ship.status == status]
+        code = STATUS_CODES.get(status)
+        if code is None:
+            return []
+        rows = np.flatnonzero(self._status == code)
+        return [self._ships_by_row[row] for row in rows]
+    
+    def get_ship_index(self) -> Dict[str, int]:
+        """ship_id -> 属性配列の行番号の対応表を取得"""
+        return dict(self._id_to_idx)
+    
+    def get_ship_arrays(self, status: Optional[str] = None) -> Tuple[List[Ship], Dict[str, np.ndarray]]:
+        """船舶リストと対応する属性配列（capacity, speed, fuel_consumption）を取得"""
+        if status is None:
+            rows = np.arange(len(self._ships_by_row))
+        else:
+            rows = np.flatnonzero(self._status == STATUS_CODES.get(status, -1))
+        ships = [self._ships_by_row[row] for row in rows]
+        return ships, {
+            'capacity': self._capacity[rows],
+            'speed': self._speed[rows],
+            'fuel_consumption': self._fuel[rows]
+        }
     
     def update_ship_status(self, ship_id: str, status: str) -> bool:
         """船舶ステータスを更新"""
+        if status not in STATUS_CODES:
+            return False
         if ship_id in self.ships:
             self.ships[ship_id].status = status
             return True
@@ -70,22 +247,47 @@ class ShipManager:
     
     def to_dataframe(self) -> pd.DataFrame:
         """DataFrame形式で出力"""
-        data = [ship.to_dict() for ship in self.ships.values()]
-        return pd.DataFrame(data)
+        # 数値・ステータス列はSoA配列をそのまま使い、行ごとのdict生成を避ける
+        ships = self._ships_by_row
+        return pd.DataFrame({
+            'ship_id': [ship.ship_id for ship in ships],
+            'name': [ship.name for ship in ships],
+            'capacity': self._capacity,
+            'speed': self._speed,
+            'fuel_consumption': self._fuel,
+            'ship_type': pd.Categorical([ship.ship_type for ship in ships]),
+            'current_location': [ship.current_location for ship in ships],
+            'status': pd.Categorical.from_codes(self._status, categories=SHIP_STATUSES),
+            'cargo': [ship.cargo for ship in ships]
+        })
     
     def from_dataframe(self, df: pd.DataFrame):
         """DataFrameから船舶データを読み込み"""
         self.ships = {}
-        for _, row in df.iterrows():
+        # 行ごとのSeries生成を避けるため列単位で取り出す
+        if 'ship_type' in df.columns:
+            ship_types = df['ship_type'].to_numpy()
+        else:
+            ship_types = np.full(len(df), 'Container', dtype=object)
+        columns = (
+            df['ship_id'].to_numpy(),
+            df['name'].to_numpy(),
+            df['capacity'].to_numpy(dtype=np.float64),
+            df['speed'].to_numpy(dtype=np.float64),
+            df['fuel_consumption'].to_numpy(dtype=np.float64),
+            ship_types
+        )
+        for ship_id, name, capacity, speed, fuel_consumption, ship_type in zip(*columns):
             ship = Ship(
-                ship_id=str(row['ship_id']),
-                name=str(row['name']),
-                capacity=float(row['capacity']),
-                speed=float(row['speed']),
-                fuel_consumption=float(row['fuel_consumption']),
-                ship_type=str(row.get('ship_type', 'Container'))
+                ship_id=str(ship_id),
+                name=str(name),
+                capacity=float(capacity),
+                speed=float(speed),
+                fuel_consumption=float(fuel_consumption),
+                ship_type=str(ship_type)
             )
             self.ships[ship.ship_id] = ship
+        self._rebuild()
     
     def export_to_csv(self, filename: str):
         """CSVファイルにエクスポート"""
@@ -94,5 +296,6 @@ class ShipManager:
     
     def import_from_csv(self, filename: str):
         """CSVファイルからインポート"""
-        df = pd.read_csv(filename)
+        # 型推論を省き、C パーサーが各列を直接目的の型で読み込む
+        df = pd.read_csv(filename, dtype=CSV_DTYPES, engine='c')
         self.from_dataframe(df)
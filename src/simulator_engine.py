@@ -1,12 +1,22 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
-import random
+from typing import List, Dict, Optional, Tuple, Iterable
+import heapq
+import itertools
 from .ship_management import Ship, ShipManager
 from .port_management import Port, PortManager, Berth
+from .kernels import EVENT_DEPARTURE, EVENT_ARRIVAL, accumulate_events
+
+# 貨物需要の優先度（低→高）
+PRIORITIES = ['Low', 'Medium', 'High']
+# イベント種別（kernels の EVENT_* コード順）
+EVENT_TYPES = ['DEPARTURE', 'ARRIVAL']
+EVENT_CODES = {'DEPARTURE': EVENT_DEPARTURE, 'ARRIVAL': EVENT_ARRIVAL}
 
 class SimulationEvent:
+    __slots__ = ('timestamp', 'event_type', 'ship_id', 'port_id', 'details', 'cancelled')
+    
     def __init__(self, timestamp: datetime, event_type: str, ship_id: str, 
                  port_id: str, details: Dict):
         self.timestamp = timestamp
@@ -14,81 +24,116 @@ class SimulationEvent:
         self.ship_id = ship_id
         self.port_id = port_id
         self.details = details
+        self.cancelled = False  # Trueの場合は取り出し時に読み飛ばす
 
 class ShippingSimulator:
     def __init__(self, ship_manager: ShipManager, port_manager: PortManager):
         self.ship_manager = ship_manager
         self.port_manager = port_manager
         self.current_time = datetime.now()
-        self.events = []
+        self.events = []  # (timestamp, 通し番号, SimulationEvent) の二分ヒープ
+        self._event_seq = itertools.count()  # 同時刻イベントの順序を登録順に固定
         self.simulation_results = []
+        # 港湾の行番号と距離行列のスナップショット（_port_distances で必要時に更新）
+        self._port_idx = {}
+        self._dist = None
         
+    def add_ships(self, ships: Iterable[Ship]) -> int:
+        """船舶を一括登録"""
+        return self.ship_manager.add_ships(ships)
+    
+    def add_ports(self, ports: Iterable[Port]) -> int:
+        """港湾を一括登録"""
+        return self.port_manager.add_ports(ports)
+    
     def setup_simulation(self, start_time: datetime, end_time: datetime):
         """シミュレーションの初期設定"""
         self.start_time = start_time
         self.end_time = end_time
         self.current_time = start_time
         self.events = []
+        self._event_seq = itertools.count()
         self.simulation_results = []
     
+    def _port_distances(self) -> Tuple[Dict[str, int], np.ndarray]:
+        """港湾の行番号と距離行列を取得（港湾の追加・削除があった場合のみ取り直す）"""
+        dist = self.port_manager.distance_matrix()
+        if dist is not self._dist:
+            self._port_idx = self.port_manager.get_port_index()
+            self._dist = dist
+        return self._port_idx, self._dist
+    
+    def schedule_event(self, event: SimulationEvent):
+        """イベントをキューに登録"""
+        heapq.heappush(self.events, (event.timestamp, next(self._event_seq), event))
+    
+    def cancel_event(self, event: SimulationEvent):
+        """登録済みイベントを取り消し"""
+        event.cancelled = True
+    
     def generate_cargo_demand(self, ports: List[str], days: int) -> pd.DataFrame:
         """貨物需要を生成"""
-        demand_data = []
-        for day in range(days):
-            for origin_port in ports:
-                for dest_port in ports:
-                    if origin_port != dest_port:
-                        # ランダムな需要生成（実際は過去データやトレンドを使用）
-                        demand = np.random.poisson(50)  # 平均50TEU
-                        demand_data.append({
-                            'date': self.start_time + timedelta(days=day),
-                            'origin_port': origin_port,
-                            'destination_port': dest_port,
-                            'cargo_volume': demand,
-                            'priority': random.choice(['Low', 'Medium', 'High'])
-                        })
-        return pd.DataFrame(demand_data)
+        n_ports = len(ports)
+        # ランダムな需要生成（実際は過去データやトレンドを使用）
+        # 日付×出発港×到着港の需要をまとめて生成し、同一港間（対角成分）を除外
+        demand = np.random.poisson(50, size=(days, n_ports, n_ports))  # 平均50TEU
+        mask = np.broadcast_to(~np.eye(n_ports, dtype=bool), demand.shape)
+        origin_idx = np.broadcast_to(np.arange(n_ports)[:, None], demand.shape)[mask]
+        dest_idx = np.broadcast_to(np.arange(n_ports)[None, :], demand.shape)[mask]
+        n_rows = len(origin_idx)
+        
+        port_ids = np.array(ports, dtype=object)
+        dates = self.start_time + pd.to_timedelta(np.arange(days), unit='D')
+        return pd.DataFrame({
+            'date': np.repeat(dates, n_ports * (n_ports - 1)),
+            'origin_port': port_ids[origin_idx],
+            'destination_port': port_ids[dest_idx],
+            'cargo_volume': demand[mask],
+            # 優先度は文字列配列を経由せず、カテゴリコードを一括で抽選する
+            'priority': pd.Categorical.from_codes(
+                np.random.randint(len(PRIORITIES), size=n_rows), categories=PRIORITIES
+            )
+        })
     
     def schedule_ship_routes(self, cargo_demand: pd.DataFrame):
         """船舶ルートをスケジューリング"""
-        available_ships = self.ship_manager.get_ships_by_status("Available")
+        # 燃費の良い順に並べた容量配列を用意（同値は登録順を維持）
+        ships, attrs = self.ship_manager.get_ship_arrays("Available")
+        order = np.argsort(attrs['fuel_consumption'], kind='stable')
+        ships = [ships[i] for i in order]
+        capacity = attrs['capacity'][order]
+        used = np.zeros(len(ships), dtype=bool)
+        remaining = len(ships)
         
-        for _, demand in cargo_demand.iterrows():
-            if not available_ships:
+        for demand in cargo_demand.itertuples(index=False):
+            if remaining == 0:
                 break
-                
-            # 最適な船舶を選択（簡易アルゴリズム）
-            best_ship = self.select_best_ship(available_ships, demand)
-            if best_ship:
-                self.assign_route(best_ship, demand)
-                available_ships.remove(best_ship)
-    
-    def select_best_ship(self, ships: List[Ship], demand) -> Optional[Ship]:
-        """最適な船舶を選択"""
-        # 容量と効率を考慮した簡易選択
-        suitable_ships = [ship for ship in ships if ship.capacity >= demand['cargo_volume']]
-        if not suitable_ships:
-            return None
-        
-        # 燃費効率が良い船舶を選択
-        return min(suitable_ships, key=lambda s: s.fuel_consumption)
+            
+            # 容量を満たす未使用船舶のうち先頭（＝最も燃費効率が良い船舶）を選択
+            eligible = (capacity >= demand.cargo_volume) & ~used
+            idx = int(np.argmax(eligible))
+            if eligible[idx]:
+                self.assign_route(ships[idx], demand)
+                used[idx] = True
+                remaining -= 1
     
     def assign_route(self, ship: Ship, demand):
-        """船舶にルートを割り当て"""
-        origin_port = self.port_manager.get_port(demand['origin_port'])
-        dest_port = self.port_manager.get_port(demand['destination_port'])
+        """船舶にルートを割り当て（demandは itertuples の行）"""
+        port_idx, dist = self._port_distances()
+        origin_row = port_idx.get(demand.origin_port)
+        dest_row = port_idx.get(demand.destination_port)
         
-        if not origin_port or not dest_port:
+        if origin_row is None or dest_row is None:
             return
         
-        # 距離と移動時間を計算
-        distance = self.port_manager.calculate_distance(
-            demand['origin_port'], demand['destination_port']
-        )
+        # 距離と移動時間を計算（キャッシュ済みの距離行列を参照）
+        distance = float(dist[origin_row, dest_row])
         travel_time = distance / ship.speed  # 時間
+        # 航行中に速度・燃費は変わらないため、燃料消費量も割り当て時に確定させる
+        fuel_consumed = travel_time * ship.fuel_consumption
         
         # イベントを生成
-        departure_time = demand['date']
+        departure_time = demand.date
         arrival_time = departure_time + timedelta(hours=travel_time)
         
         # 出発イベント
@@ -96,8 +141,9 @@ class ShippingSimulator:
             timestamp=departure_time,
             event_type="DEPARTURE",
             ship_id=ship.ship_id,
-            port_id=demand['origin_port'],
-            details={'cargo_volume': demand['cargo_volume'], 'destination': demand['destination_port']}
+            port_id=demand.origin_port,
+            details={'cargo_volume': demand.cargo_volume, 'destination': demand.destination_port,
+                     'travel_distance': distance, 'fuel_consumed': fuel_consumed}
         )
         
         # 到着イベント
@@ -105,39 +151,103 @@ class ShippingSimulator:
             timestamp=arrival_time,
             event_type="ARRIVAL",
             ship_id=ship.ship_id,
-            port_id=demand['destination_port'],
-            details={'cargo_volume': demand['cargo_volume'], 'travel_distance': distance}
+            port_id=demand.destination_port,
+            details={'cargo_volume': demand.cargo_volume, 'travel_distance': distance,
+                     'fuel_consumed': fuel_consumed}
         )
         
-        self.events.extend([departure_event, arrival_event])
+        self.schedule_event(departure_event)
+        self.schedule_event(arrival_event)
         ship.status = "Scheduled"
     
     def run_simulation(self) -> Dict:
         """シミュレーションを実行"""
-        # イベントを時系列順にソート
-        self.events.sort(key=lambda x: x.timestamp)
+        # 終了時刻までのイベントを時系列順に取り出し、列ごとの配列（SoA）に展開する
+        # （以降のイベントはキューに残す）
+        timestamps, event_codes, ship_ids, port_ids, volumes, distances, fuels = [], [], [], [], [], [], []
+        while self.events and self.events[0][0] <= self.end_time:
+            _, _, event = heapq.heappop(self.events)
+            if event.cancelled:
+                continue
+            self.current_time = event.timestamp
+            code = EVENT_CODES.get(event.event_type)
+            if code is None:
+                continue  # 出発・到着以外のイベントは集計対象外
+            timestamps.append(event.timestamp)
+            event_codes.append(code)
+            ship_ids.append(event.ship_id)
+            port_ids.append(event.port_id)
+            volumes.append(event.details['cargo_volume'])
+            # 出発イベントでは距離・燃料を使わないため、未設定の場合も許容する
+            distances.append(event.details.get('travel_distance', 0.0))
+            fuels.append(event.details.get('fuel_consumed', np.nan))
         
-        simulation_log = []
-        port_statistics = {port_id: {'ships_handled': 0, 'cargo_handled': 0, 'waiting_times': []} 
-                          for port_id in self.port_manager.ports.keys()}
-        ship_statistics = {ship.ship_id: {'total_distance': 0, 'fuel_consumed': 0, 'cargo_delivered': 0}
-                          for ship in self.ship_manager.get_all_ships()}
+        ships, attrs = self.ship_manager.get_ship_arrays()
+        ship_index = self.ship_manager.get_ship_index()
+        port_list = self.port_manager.get_all_ports()
+        port_index = self.port_manager.get_port_index()
         
-        for event in self.events:
-            if event.timestamp > self.end_time:
-                break
-                
-            self.current_time = event.timestamp
-            
-            # イベント処理
-            if event.event_type == "DEPARTURE":
-                self.handle_departure(event, simulation_log, ship_statistics)
-            elif event.event_type == "ARRIVAL":
-                self.handle_arrival(event, simulation_log, port_statistics, ship_statistics)
+        etype = np.array(event_codes, dtype=np.int8)
+        sidx = np.fromiter((ship_index.get(sid, -1) for sid in ship_ids), dtype=np.int32, count=len(ship_ids))
+        pidx = np.fromiter((port_index.get(pid, -1) for pid in port_ids), dtype=np.int32, count=len(port_ids))
+        vol = np.asarray(volumes)
+        dist = np.array(distances, dtype=np.float64)
+        fuel = np.array(fuels, dtype=np.float64)
+        
+        # 登録されていない船舶・港湾のイベントは処理しない
+        valid = (sidx >= 0) & ((etype != EVENT_ARRIVAL) | (pidx >= 0))
+        etype, sidx, pidx, vol, dist, fuel = etype[valid], sidx[valid], pidx[valid], vol[valid], dist[valid], fuel[valid]
+        
+        # 燃料消費量が未設定のイベントは 移動距離 / 速度 × 燃費 で補完
+        missing = np.isnan(fuel)
+        if missing.any():
+            ship_rows = sidx[missing]
+            fuel[missing] = (dist[missing] / attrs['speed'][ship_rows]
+                             * attrs['fuel_consumption'][ship_rows])
+        
+        port_ships, port_cargo, ship_dist, ship_cargo, ship_fuel, last_event = accumulate_events(
+            etype, sidx, pidx, vol, dist, fuel, len(ships), len(port_list)
+        )
+        
+        # 貨物量が整数の場合は集計結果も整数で返す
+        if vol.dtype.kind in 'iu':
+            port_cargo = port_cargo.astype(vol.dtype)
+            ship_cargo = ship_cargo.astype(vol.dtype)
+        port_statistics = {
+            port.port_id: {'ships_handled': handled, 'cargo_handled': cargo, 'waiting_times': []}
+            for port, handled, cargo in zip(port_list, port_ships.tolist(), port_cargo.tolist())
+        }
+        ship_statistics = {
+            ship.ship_id: {'total_distance': distance, 'fuel_consumed': consumed, 'cargo_delivered': cargo}
+            for ship, distance, consumed, cargo in zip(ships, ship_dist.tolist(), ship_fuel.tolist(),
+                                                       ship_cargo.tolist())
+        }
+        
+        # 各船舶の最後のイベントから現在の状態を反映
+        for ship, last in zip(ships, last_event.tolist()):
+            if last < 0:
+                continue
+            if etype[last] == EVENT_DEPARTURE:
+                ship.status = "In Transit"
+                ship.cargo = vol[last].item()
+            else:
+                ship.status = "Available"
+                ship.cargo = 0
+        
+        # イベントログを列単位で組み立てる
+        rows = np.flatnonzero(valid)
+        simulation_log = pd.DataFrame({
+            'timestamp': pd.to_datetime(np.array(timestamps, dtype=object)[rows]),
+            'event': pd.Categorical.from_codes(etype, categories=EVENT_TYPES),
+            'ship_id': np.array(ship_ids, dtype=object)[rows],
+            'port_id': np.array(port_ids, dtype=object)[rows],
+            'cargo_volume': vol,
+            'fuel_consumed': np.where(etype == EVENT_ARRIVAL, fuel, np.nan)
+        })
         
         # 結果をまとめる
         results = {
-            'simulation_log': pd.DataFrame(simulation_log),
+            'simulation_log': simulation_log,
             'port_statistics': port_statistics,
             'ship_statistics': ship_statistics,
             'summary': self.generate_summary(port_statistics, ship_statistics)
@@ -145,50 +255,6 @@ class ShippingSimulator:
         
         return results
     
-    def handle_departure(self, event: SimulationEvent, log: List, ship_stats: Dict):
-        """出発イベントを処理"""
-        ship = self.ship_manager.get_ship(event.ship_id)
-        if ship:
-            ship.status = "In Transit"
-            ship.cargo = event.details['cargo_volume']
-            
-            log.append({
-                'timestamp': event.timestamp,
-                'event': 'DEPARTURE',
-                'ship_id': event.ship_id,
-                'port_id': event.port_id,
-                'cargo_volume': event.details['cargo_volume']
-            })
-    
-    def handle_arrival(self, event: SimulationEvent, log: List, port_stats: Dict, ship_stats: Dict):
-        """到着イベントを処理"""
-        ship = self.ship_manager.get_ship(event.ship_id)
-        port = self.port_manager.get_port(event.port_id)
-        
-        if ship and port:
-            # 統計情報を更新
-            port_stats[event.port_id]['ships_handled'] += 1
-            port_stats[event.port_id]['cargo_handled'] += event.details['cargo_volume']
-            
-            ship_stats[event.ship_id]['total_distance'] += event.details['travel_distance']
-            ship_stats[event.ship_id]['cargo_delivered'] += event.details['cargo_volume']
-            
-            # 燃料消費量を計算
-            fuel_consumed = (event.details['travel_distance'] / ship.speed) * ship.fuel_consumption
-            ship_stats[event.ship_id]['fuel_consumed'] += fuel_consumed
-            
-            ship.status = "Available"
-            ship.cargo = 0
-            
-            log.append({
-                'timestamp': event.timestamp,
-                'event': 'ARRIVAL',
-                'ship_id': event.ship_id,
-                'port_id': event.port_id,
-                'cargo_volume': event.details['cargo_volume'],
-                'fuel_consumed': fuel_consumed
-            })
-    
     def generate_summary(self, port_stats: Dict, ship_stats: Dict) -> Dict:
         """サマリーを生成"""
         total_cargo = sum(stats['cargo_handled'] for stats in port_stats.values())
@@ -39,21 +39,17 @@ def validate_data(df: pd.DataFrame, data_type: str) -> Dict:
         if missing_cols:
             errors.append(f"必須列が不足しています: {', '.join(missing_cols)}")
         
-        # データ型の確認
-        if 'capacity' in df.columns:
-            if not pd.api.types.is_numeric_dtype(df['capacity']):
-                errors.append("容量は数値である必要があります")
-            elif (df['capacity'] <= 0).any():
-                warnings.append("容量に0以下の値があります")
-        
-        if 'speed' in df.columns:
-            if not pd.api.types.is_numeric_dtype(df['speed']):
-                errors.append("速度は数値である必要があります")
-            elif (df['speed'] <= 0).any():
-                warnings.append("速度に0以下の値があります")
+        # データ型の確認（列ごとにNumPy配列を1回だけ取り出して判定）
+        for col, label in (('capacity', '容量'), ('speed', '速度')):
+            if col not in df.columns:
+                continue
+            if not pd.api.types.is_numeric_dtype(df[col]):
+                errors.append(f"{label}は数値である必要があります")
+            elif (df[col].to_numpy() <= 0).any():
+                warnings.append(f"{label}に0以下の値があります")
         
         # 重複チェック
-        if 'ship_id' in df.columns and df['ship_id'].duplicated().any():
+        if 'ship_id' in df.columns and pd.Index(df['ship_id']).has_duplicates:
             errors.append("船舶IDに重複があります")
     
     elif data_type == "ports":
@@ -64,21 +60,19 @@ def validate_data(df: pd.DataFrame, data_type: str) -> Dict:
         if missing_cols:
             errors.append(f"必須列が不足しています: {', '.join(missing_cols)}")
         
-        # 緯度経度の確認
-        if 'latitude' in df.columns:
-            if not pd.api.types.is_numeric_dtype(df['latitude']):
-                errors.append("緯度は数値である必要があります")
-            elif not df['latitude'].between(-90, 90).all():
-                errors.append("緯度は-90〜90の範囲である必要があります")
-        
-        if 'longitude' in df.columns:
-            if not pd.api.types.is_numeric_dtype(df['longitude']):
-                errors.append("経度は数値である必要があります")
-            elif not df['longitude'].between(-180, 180).all():
-                errors.append("経度は-180〜180の範囲である必要があります")
+        # 緯度経度の確認（範囲の上下限を1回の論理積でまとめて判定）
+        for col, label, limit in (('latitude', '緯度', 90), ('longitude', '経度', 180)):
+            if col not in df.columns:
+                continue
+            if not pd.api.types.is_numeric_dtype(df[col]):
+                errors.append(f"{label}は数値である必要があります")
+                continue
+            values = df[col].to_numpy()
+            if not np.logical_and(values >= -limit, values <= limit).all():
+                errors.append(f"{label}は-{limit}〜{limit}の範囲である必要があります")
         
         # 重複チェック
-        if 'port_id' in df.columns and df['port_id'].duplicated().any():
+        if 'port_id' in df.columns and pd.Index(df['port_id']).has_duplicates:
             errors.append("港湾IDに重複があります")
     
     return {
@@ -112,9 +106,10 @@ def format_simulation_results(results: Dict) -> Dict:
     # ログデータの整理
     if 'simulation_log' in results and not results['simulation_log'].empty:
         log_df = results['simulation_log']
-        formatted['daily_summary'] = log_df.groupby(log_df['timestamp'].dt.date).agg({
-            'cargo_volume': 'sum',
-            'ship_id': 'nunique'
-        }).rename(columns={'ship_id': 'active_ships'})
+        # dt.date（Pythonオブジェクト）ではなく datetime64 のまま日単位に丸めて集計
+        formatted['daily_summary'] = log_df.groupby(log_df['timestamp'].dt.floor('D'), sort=False).agg(
+            cargo_volume=('cargo_volume', 'sum'),
+            active_ships=('ship_id', 'nunique')
+        )
     
     return formatted